@@ -1,5 +1,9 @@
 # fichier : app.py
 import streamlit as st
+from ressources import lancer_prechauffage
+
+# Warm the process-wide caches used by the pages
+lancer_prechauffage()
 
 st.title("👋 Bienvenue!")
 st.write("ok")
@@ -0,0 +1,99 @@
+# fichier : bench_startup.py
+# Cold-start benchmark: load each page in a fresh interpreter and check it against a time budget.
+# A page also fails when its own code path imports one of the heavy dependencies.
+#
+#   python bench_startup.py [--budget-ms 150] [--repeat 5]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PAGES = [
+    "Conseil Agricole.py",
+    "pages/Attestation de suivi.py",
+    "pages/Cachier cultural.py",
+]
+
+# Dependencies that a page should only import once the user needs them
+MODULES_LOURDS = ["pandas", "numpy", "reportlab", "xlsxwriter", "openpyxl", "PIL"]
+
+# Runs in the child process. Streamlit is imported before timing because the
+# server has it loaded already; the page's own imports and top-level code are timed.
+# Each heavy import is attributed to the thread doing it: the script thread is the
+# page itself, other threads are the background cache warm-up.
+SCRIPT_ENFANT = """
+import importlib.abc, json, runpy, sys, threading, time
+import streamlit
+surveilles = set(sys.argv[2:])
+page, arriere_plan = set(), set()
+
+class Traceur(importlib.abc.MetaPathFinder):
+    def find_spec(self, nom, path, target=None):
+        if nom in surveilles and nom not in sys.modules:
+            principal = threading.current_thread() is threading.main_thread()
+            (page if principal else arriere_plan).add(nom)
+        return None
+
+sys.meta_path.insert(0, Traceur())
+debut = time.perf_counter()
+runpy.run_path(sys.argv[1], run_name="__main__")
+duree = time.perf_counter() - debut
+print(json.dumps({"ms": duree * 1000, "lourds": sorted(page), "arriere_plan": sorted(arriere_plan)}))
+"""
+
+
+def mesurer_page(page, repertoire):
+    """Load one page in a fresh interpreter, return (milliseconds, heavy modules, background modules)"""
+    resultat = subprocess.run(
+        [sys.executable, "-c", SCRIPT_ENFANT, page, *MODULES_LOURDS],
+        cwd=repertoire, capture_output=True, text=True,
+    )
+    if resultat.returncode != 0:
+        raise RuntimeError(f"{page} a échoué :\n{resultat.stderr}")
+    mesure = json.loads(resultat.stdout.strip().splitlines()[-1])
+    return mesure["ms"], mesure["lourds"], mesure["arriere_plan"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du démarrage à froid des pages")
+    parser.add_argument("--budget-ms", type=float, default=150.0,
+                        help="maximum median load time per page (ms)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of cold loads per page")
+    args = parser.parse_args()
+
+    repertoire = os.path.dirname(os.path.abspath(__file__))
+    depassements = []
+    imports_lourds = []
+
+    for page in PAGES:
+        mesures = [mesurer_page(page, repertoire) for _ in range(args.repeat)]
+        mediane = statistics.median(ms for ms, _, _ in mesures)
+        lourds = sorted({m for _, modules, _ in mesures for m in modules})
+        arriere_plan = sorted({m for _, _, modules in mesures for m in modules})
+
+        statut = "OK"
+        if mediane > args.budget_ms:
+            statut = "HORS BUDGET"
+            depassements.append(page)
+        if lourds:
+            statut = "IMPORTS LOURDS" if statut == "OK" else statut + ", IMPORTS LOURDS"
+            imports_lourds.append(f"{page} ({', '.join(lourds)})")
+
+        ligne = f"{page:<35} {mediane:8.1f} ms  [{statut}]  modules lourds : {', '.join(lourds) or '-'}"
+        if arriere_plan:
+            ligne += f"  (préchauffage en arrière-plan : {', '.join(arriere_plan)})"
+        print(ligne)
+
+    if depassements:
+        print(f"\nBudget de {args.budget_ms:.0f} ms dépassé : {', '.join(depassements)}")
+    if imports_lourds:
+        print(f"\nDépendances lourdes importées au chargement : {'; '.join(imports_lourds)}")
+    if depassements or imports_lourds:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
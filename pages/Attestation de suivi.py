@@ -1,26 +1,12 @@
 import streamlit as st
-import pandas as pd
 import datetime
 from io import BytesIO
-import zipfile
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import cm
-from reportlab.lib.utils import ImageReader
 from textwrap import wrap
-import os
+from ressources import (LOGO_PATH, SIGNATURE_PATH, LARGEUR_LIGNE,
+                        charger_image, charger_modele_attestation, lancer_prechauffage)
 
-# --- Load static assets ---
-LOGO_PATH = "logo1.PNG"
-SIGNATURE_PATH = "signaturer.PNG"
-
-def charger_image(path):
-    if os.path.exists(path):
-        return ImageReader(path)
-    return None
-
-logo_image = charger_image(LOGO_PATH)
-signature_image = charger_image(SIGNATURE_PATH)
+# --- Static template (shared across sessions); images are loaded on first PDF
+modele_attestation = charger_modele_attestation()
 
 # --- Format date in French style
 def formater_date_lettres(date_str):
@@ -31,16 +17,20 @@ def formater_date_lettres(date_str):
 
 # --- Generate PDF
 def generer_pdf(nom, date_str, commune, code_postal, logo, signature):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.units import cm
+
     buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
+    c = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
     largeur, hauteur = A4
 
     marge_gauche = 2 * cm
 
     # Logo full width
     if logo:
-        c.drawImage(logo, x=marge_gauche, y=hauteur - 8 * cm,
-                    width=largeur - 2 * cm, preserveAspectRatio=True, mask='auto')
+        c.drawImage(logo.lecteur(), x=marge_gauche, y=hauteur - 8 * cm,
+                    width=largeur - 2 * cm, height=logo.hauteur, preserveAspectRatio=True, mask='auto')
 
     # Date
     c.setFont("Helvetica", 12)
@@ -61,17 +51,10 @@ def generer_pdf(nom, date_str, commune, code_postal, logo, signature):
 
     # Body
     c.setFont("Helvetica", 11)
-    body = f"""J’atteste que {nom} à {commune.upper()} ({code_postal[:2]}) a souscrit à un suivi technique en Arboriculture auprès de notre chambre d’agriculture. 
-A ce titre :
-• Son verger est suivi au moins à 3 reprises durant l’année, avec une préconisation. 
-• Il reçoit chaque semaine les flash arbo.
-• Il bénéficie de la « hotline » technique de la chambre.
-• Il a participé aux réunions de bilan phytosanitaire et de programme phytosanitaire en hiver 2024-25.
-• Son cahier de culture et ses interventions phytosanitaires sont conformes aux réglementations en vigueur, la saisie et la gestion est réalisée sur notre outil de traçabilité SMAG Farmer."""
+    intro = f"J’atteste que {nom} à {commune.upper()} ({code_postal[:2]}) a souscrit à un suivi technique en Arboriculture auprès de notre chambre d’agriculture."
 
     y = box_bottom - 1 * cm
-    for line in body.splitlines():
-        wrapped = wrap(line, width=105)
+    for wrapped in [wrap(intro, width=LARGEUR_LIGNE)] + modele_attestation:
         for subline in wrapped:
             c.drawString(marge_gauche, y, subline)
             y -= 0.55 * cm
@@ -79,8 +62,8 @@ A ce titre :
 
     # Signature
     if signature:
-        c.drawImage(signature, x=marge_gauche, y=1.5 * cm,
-                    width=largeur - 4 * cm, preserveAspectRatio=True, mask='auto')
+        c.drawImage(signature.lecteur(), x=marge_gauche, y=1.5 * cm,
+                    width=largeur - 4 * cm, height=signature.hauteur, preserveAspectRatio=True, mask='auto')
 
     c.save()
     buffer.seek(0)
@@ -105,6 +88,9 @@ with st.expander("ℹ️ Instructions pour le fichier Excel requis"):
 uploaded_excel = st.file_uploader("📁 Importer un fichier Excel", type=["xlsx"])
 
 if uploaded_excel:
+    import pandas as pd
+    import zipfile
+
     try:
         df = pd.read_excel(uploaded_excel)
         required_cols = {"Nom", "Date", "Commune", "CodePostal"}
@@ -112,6 +98,8 @@ if uploaded_excel:
             st.error("❌ Le fichier doit contenir les colonnes : Nom, Date, Commune, CodePostal")
         else:
             st.success("✅ Données chargées, génération en cours...")
+            logo_image = charger_image(LOGO_PATH)
+            signature_image = charger_image(SIGNATURE_PATH)
 
             zip_buffer = BytesIO()
             with zipfile.ZipFile(zip_buffer, "w") as zip_file:
@@ -148,7 +136,8 @@ if submitted:
     else:
         try:
             date_str_manual = date_manual.strftime("%d/%m/%Y")
-            pdf_buffer = generer_pdf(nom_manual, date_str_manual, commune_manual, cp_manual, logo_image, signature_image)
+            pdf_buffer = generer_pdf(nom_manual, date_str_manual, commune_manual, cp_manual,
+                                     charger_image(LOGO_PATH), charger_image(SIGNATURE_PATH))
             st.success("✅ Attestation générée avec succès")
             st.download_button(
                 label="📥 Télécharger l'attestation",
@@ -158,3 +147,6 @@ if submitted:
             )
         except Exception as e:
             st.error(f"❌ Une erreur s’est produite : {e}")
+
+# --- Warm the shared caches in the background once the page is drawn, if opened directly
+lancer_prechauffage()
@@ -1,33 +1,177 @@
-import pandas as pd
 import streamlit as st
 import io
-import xlsxwriter
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 
+# --- SMAG column schema ---
+COL_DATE = "Interventions des parcelles culturales.Date début"
+COL_PREV = "Interventions des parcelles culturales.Prévisionnelle"
+COL_DOSE = "Intrants des parcelles culturales.Dose"
+COL_UNITE = "Intrants des parcelles culturales.Unité"
+COL_TYPE = "Types d'interventions.Nom"
+COL_PARCELLE = "Parcelles culturales.Nom"
+COL_PRODUIT = "Traitements.Nom"
+COL_CIBLE = "Cibles à l'intrant.Nom de la cible"
+
+# Canonical name -> aliases found in SMAG exports
+SCHEMA_COLONNES = {
+    COL_DATE: ["Interventions des parcelles culturales.Date dbut"],
+    COL_PREV: ["Interventions des parcelles culturales.Prvisionnelle"],
+    COL_DOSE: [],
+    COL_UNITE: ["Intrants des parcelles culturales.Unit"],
+    COL_TYPE: [],
+    COL_PARCELLE: [],
+    COL_PRODUIT: [],
+    COL_CIBLE: ["Cibles l'intrant.Nom de la cible"],
+}
+
+# Farm and parcel inventory columns -> displayed names
+COLONNES_EXPLOITATION = {
+    "Exploitations.Raison sociale": "Raison sociale",
+    "Exploitations.Adresse_exploitant": "Adresse",
+    "Exploitations.Téléphone": "Téléphone",
+    "Exploitations.Code SIRET": "Numéro SIRET",
+    "Parcelles culturales.Culture": "Espèce"
+}
+COLONNES_INVENTAIRE = {
+    COL_PARCELLE: "Nom de la parcelle",
+    "Variétés de parcelle.Nom": "Variété",
+    "Parcelles culturales.Lieu-dit": "Lieu-dit",
+    "Parcelles culturales.Surface": "Surface (ha)",
+    "Parcelles culturales.PFI Verger éco responsable": "PFI Verger éco responsable",
+    "Parcelles culturales.ZRP Zéro Résidu Pesticide": "ZRP Zéro Résidu Pesticide",
+    "Parcelles culturales.Global Gap": "Global GAP",
+    "Parcelles culturales.HVE 3": "HVE 3"
+}
+
+# An export with none of these columns gives no table at all
+COLONNES_TABLES = [*COLONNES_EXPLOITATION, *COLONNES_INVENTAIRE]
+
+# Columns the intervention tables need, the other tables are built without them
+COLONNES_INTERVENTIONS = [COL_DATE, COL_TYPE, COL_PARCELLE, COL_DOSE]
+
+# Compiled once: alias lookup and the generic fixes for columns outside the schema
+_ALIAS_COLONNES = {
+    alias: canonique
+    for canonique, alias_connus in SCHEMA_COLONNES.items()
+    for alias in [canonique, *alias_connus]
+}
+_CORRECTIONS_COLONNES = {
+    "Prvisionnelle": "Prévisionnelle",
+    "dbut": "début",
+    "Unit": "Unité",
+    "l'intrant": "à l'intrant",
+}
+_MOTIF_CORRECTIONS = re.compile(r"Prvisionnelle|dbut|Unit(?!é)|(?<!à )l'intrant")
+
+
+# --- Intervention types ---
+# Operations shown in the "Operation agricole" sheet
+TYPES_OPERATIONS = [
+    "Arrachage culture pérenne",
+    "Broyage des bois de taille",
+    "Brûlage des bois de taille",
+    "Ebourgeonnage",
+    "Ébourgeonnage fructifère",
+    "Écimage",
+    "Éclaircissage manuel/physiologique",
+    "Élagage",
+    "Élagage double têtes",
+    "Entreplantation-complantation-rebrochage",
+    "Élagage",
+    "Élagage double têtes",
+    "Liage",
+    "Marcotage",
+    "Palissage",
+    "Pré-taille",
+    "Surgreffage",
+    "Taille",
+    "Taille au sabre",
+    "Taille en vert",
+    "Tirage des bois"
+]
+
+TYPES_FERTILISATION = [
+    "Amendements calco-magnésiens", "Biostimulant", "Boues de station d'épuration/compost urbain",
+    "Effluents d'élevage", "Fertilisation minérale", "Fertilisation minérale Bulk",
+    "Fertirrigation", "Obligo-éléments", "Organo-minéral", "Fertilisation organique",
+    "Sous-produits/déchets alimentaires", "Sous-produits/déchets non alimentaires", "Supports de culture"
+]
+
+# Types left out of the "Traitement" sheet
+TYPES_EXCLUS_TRAITEMENT = [
+    "Amendements calco-magnésiens", "Biostimulant", "Boues de station d'épuration/compost urbain",
+    "Effluents d'élevage", "Fertilisation minérale", "Fertilisation minérale Bulk",
+    "Fertirrigation", "Obligo-éléments", "Organo-minéral", "Taille", "Fertilisation organique",
+    "Irrigation", "Sous-produits/déchets alimentaires", "Sous-produits/déchets non alimentaires",
+    "Supports de culture",
+    "Arrachage culture pérenne", "Broyage des bois de taille", "Brûlage des bois de taille",
+    "Ebourgeonnage", "Ébourgeonnage fructifère", "Écimage", "Eclaircissage manuel/physiologique",
+    "Elagage", "Elagage double tétes", "Entreplantation-complantation-rebrochage",
+    "Elagage double têtes", "Liage", "Marcotage", "Palissage", "Pré-taille", "Surgreffage",
+    "Taille au sabre", "Taille en vert", "Tirage des bois"
+]
+
+
+def normaliser_nom_colonne(nom):
+    """Return the canonical name of a SMAG column"""
+    nom = nom.strip().strip('"')
+    if nom in _ALIAS_COLONNES:
+        return _ALIAS_COLONNES[nom]
+    return _MOTIF_CORRECTIONS.sub(lambda m: _CORRECTIONS_COLONNES[m.group(0)], nom)
+
+
+def valider_entete(uploaded_file):
+    """Check the header line against the schema.
+
+    Returns whether any table can be built and the missing intervention columns.
+    """
+    entete = uploaded_file.readline()
+    uploaded_file.seek(0)
+    if isinstance(entete, bytes):
+        entete = entete.decode('cp1252', errors='replace')
+
+    colonnes = {normaliser_nom_colonne(col) for col in entete.rstrip('\r\n').split('\t')}
+    exploitable = any(col in colonnes for col in COLONNES_TABLES)
+    return exploitable, [col for col in COLONNES_INTERVENTIONS if col not in colonnes]
+
+
+# --- Processing messages ---
+_journal = threading.local()
+
+
+def signaler(niveau, message):
+    """Report a message: collected while a journal is open, shown directly otherwise"""
+    messages = getattr(_journal, "messages", None)
+    if messages is None:
+        getattr(st, niveau)(message)
+    else:
+        messages.append((niveau, message))
+
+
 def charger_fichier(uploaded_file):
     """Load and validate the input file"""
+    import pandas as pd
+
     try:
         df = pd.read_csv(uploaded_file,sep='\t',encoding='cp1252',na_values=['', 'NA', 'N/A', 'NaN', 'None', ' '],keep_default_na=False)
         if df.empty:
-            st.error("Le fichier est vide ou ne contient pas de données valides")
+            signaler("error", "Le fichier est vide ou ne contient pas de données valides")
             return None
 
         return df
 
     except Exception as e:
-        st.error(f"❌ Erreur lors du chargement du fichier : {str(e)}")
+        signaler("error", f"❌ Erreur lors du chargement du fichier : {str(e)}")
         return None
 
 
 def nettoyer_noms_colonnes(df):
-    """Clean column names by fixing common errors"""
-    df.columns = df.columns.str.replace("Prvisionnelle", "Prévisionnelle") \
-        .str.replace("dbut", "début") \
-        .str.replace("Unit", "Unité") \
-        .str.replace("Unitéé", "Unité") \
-        .str.replace("l'intrant", "à l'intrant") \
-        .str.replace("à à", "à")
+    """Clean column names by mapping them to the schema"""
+    df.columns = [normaliser_nom_colonne(col) for col in df.columns]
     return df
 
 
@@ -82,21 +226,17 @@ def nettoyer_noms_colonnes(df):
 #         df.drop(columns=[col_unite], inplace=True, errors='ignore')
 #
 #     return df
-import streamlit as st
-import pandas as pd
+
 
 def traiter_donnees(df):
     """Process and filter the data"""
+    import pandas as pd
 
     # Column definitions
-    col_date = "Interventions des parcelles culturales.Date début"
-    col_prev = "Interventions des parcelles culturales.Prévisionnelle"
-    col_dose = "Intrants des parcelles culturales.Dose"
-    col_unite = "Intrants des parcelles culturales.Unité"
-
-    # Show original dataframe
-    st.subheader("Tableau original")
-    st.dataframe(df)
+    col_date = COL_DATE
+    col_prev = COL_PREV
+    col_dose = COL_DOSE
+    col_unite = COL_UNITE
 
     # Filter for "Non" values in Prévisionnelle column
     if col_prev in df.columns:
@@ -104,7 +244,7 @@ def traiter_donnees(df):
         df = df[~df[col_prev].isna()]
 
         if df.empty:
-            st.warning("Aucune donnée avec 'Prévisionnelle = Non' trouvée")
+            signaler("warning", "Aucune donnée avec 'Prévisionnelle = Non' trouvée")
             return df
 
     # Date processing
@@ -120,7 +260,7 @@ def traiter_donnees(df):
         initial_count = len(df)
         df = df.dropna(subset=[col_date])
         if len(df) < initial_count:
-            st.warning(f"{initial_count - len(df)} lignes supprimées (dates invalides)")
+            signaler("warning", f"{initial_count - len(df)} lignes supprimées (dates invalides)")
 
         # Standardize year
         if not df.empty:
@@ -147,20 +287,85 @@ def traiter_donnees(df):
     return df
 
 
-def get_table_exploitations_parcelles(df):
+def categoriser_interventions(df):
+    """Single sheet category of every row, for the per-parcel sheets and the search.
+
+    The Traitement table does not use it: it keeps every type outside
+    TYPES_EXCLUS_TRAITEMENT, including rows also shown in another table.
+    """
+    import numpy as np
+    import pandas as pd
+
+    types = df[COL_TYPE]
+    categories = np.select(
+        [
+            types.astype(str).str.lower().str.strip() == "irrigation",
+            types.isin(TYPES_FERTILISATION),
+            types.isin(TYPES_OPERATIONS),
+            ~types.isin(TYPES_EXCLUS_TRAITEMENT),
+        ],
+        ["Irrigation", "Fertilisation", "Operation agricole", "Traitement"],
+        default="",
+    )
+    return pd.Series(categories, index=df.index)
+
+
+class ModeleSaison:
+    """Processed season with the keys shared by every table builder, computed once"""
+
+    def __init__(self, df):
+        import pandas as pd
+
+        self.df = df
+
+        # Typed dates, parsed once from the dd/mm/YYYY strings left by traiter_donnees
+        if COL_DATE in df.columns:
+            self.dates = pd.to_datetime(df[COL_DATE], format="%d/%m/%Y", errors="coerce")
+        else:
+            self.dates = pd.Series(pd.NaT, index=df.index)
+
+        # Parcel codes 1..n in order of first appearance, 0 when the parcel is missing
+        if COL_PARCELLE in df.columns:
+            noms = df[COL_PARCELLE].astype("string").str.strip().replace("", pd.NA)
+            codes, self.parcelles = pd.factorize(noms)
+            self.codes_parcelles = pd.Series(codes + 1, index=df.index)
+        else:
+            self.parcelles = pd.Index([])
+            self.codes_parcelles = pd.Series(0, index=df.index)
+
+        # Sheet each row belongs to
+        if COL_TYPE in df.columns:
+            self.categories = categoriser_interventions(df)
+        else:
+            self.categories = pd.Series("", index=df.index)
+
+    def lignes(self, categorie):
+        """Mask of the dated rows of a category"""
+        return (self.categories == categorie) & self.dates.notna()
+
+    def marques_parcelles(self, cles, masque, en_codes=False):
+        """One 'x' column per parcel, in code order, for each group of rows sharing the keys"""
+        import numpy as np
+        import pandas as pd
+
+        codes = self.codes_parcelles[masque]
+        presents = np.unique(codes[codes > 0])
+        comptes = pd.crosstab(cles, codes).reindex(columns=presents, fill_value=0)
+        noms = [str(code) if en_codes else self.parcelles[code - 1] for code in presents]
+        return pd.DataFrame(np.where(comptes.to_numpy() > 0, "x", ""), index=comptes.index, columns=noms)
+
+
+def get_table_exploitations_parcelles(saison):
     """Generate farm information table"""
-    rename_dict = {
-        "Exploitations.Raison sociale": "Raison sociale",
-        "Exploitations.Adresse_exploitant": "Adresse",
-        "Exploitations.Téléphone": "Téléphone",
-        "Exploitations.Code SIRET": "Numéro SIRET",
-        "Parcelles culturales.Culture": "Espèce"
-    }
+    import pandas as pd
+
+    df = saison.df
+    rename_dict = COLONNES_EXPLOITATION
 
     cols = [col for col in rename_dict.keys() if col in df.columns]
 
     if not cols:
-        st.error("Aucune colonne valide trouvée pour le tableau des exploitations")
+        signaler("error", "Aucune colonne valide trouvée pour le tableau des exploitations")
         return None
 
     result = []
@@ -192,20 +397,18 @@ def get_table_exploitations_parcelles(df):
     return table
 
 
-def get_table_codification_parcelles(df):
+def get_table_codification_parcelles(saison):
     """Generate parcel coding table"""
-    parcelle_cols = [col for col in df.columns if "Parcelles" in col and "Nom" in col]
+    import pandas as pd
 
-    if not parcelle_cols:
-        st.warning("Colonne 'Nom de parcelle' introuvable")
+    if COL_PARCELLE not in saison.df.columns:
+        signaler("warning", "Colonne 'Nom de parcelle' introuvable")
         return None
 
-    parcelle_col = parcelle_cols[0]
-    parcelle_names = df[parcelle_col].dropna().astype(str).str.strip()
-    parcelle_names = parcelle_names[parcelle_names != ''].unique()
+    parcelle_names = list(saison.parcelles)
 
     if len(parcelle_names) == 0:
-        st.warning("Aucun nom de parcelle valide trouvé")
+        signaler("warning", "Aucun nom de parcelle valide trouvé")
         return None
 
     df_codif = pd.DataFrame([parcelle_names, range(1, len(parcelle_names) + 1)])
@@ -263,331 +466,175 @@ def get_table_codification_parcelles(df):
 #         st.error(f"Erreur: {str(e)}")
 #         return None
 
-def get_table_operations_agricoles_codifie(df):
+def get_table_operations_agricoles_codifie(saison):
     """Generate agricultural operations table"""
-
-    # Define allowed operations
-    operations = [
-        "Arrachage culture pérenne",
-        "Broyage des bois de taille",
-        "Brûlage des bois de taille",
-        "Ebourgeonnage",
-        "Ébourgeonnage fructifère",
-        "Écimage",
-        "Éclaircissage manuel/physiologique",
-        "Élagage",
-        "Élagage double têtes",
-        "Entreplantation-complantation-rebrochage",
-        "Élagage",
-        "Élagage double têtes",
-        "Liage",
-        "Marcotage",
-        "Palissage",
-        "Pré-taille",
-        "Surgreffage",
-        "Taille",
-        "Taille au sabre",
-        "Taille en vert",
-        "Tirage des bois"
-    ]
-
-    # Find required columns
-    date_cols = [col for col in df.columns if "Date" in col and "début" in col]
-    type_col = "Types d'interventions.Nom"
-    parcelle_col = "Parcelles culturales.Nom"
-
-    if not date_cols or type_col not in df.columns or parcelle_col not in df.columns:
-        st.error("Colonnes requises manquantes")
+    df = saison.df
+    if COL_DATE not in df.columns or COL_TYPE not in df.columns or COL_PARCELLE not in df.columns:
+        signaler("error", "Colonnes requises manquantes")
         return None
 
-    col_date = date_cols[0]
-
     try:
-        df_op = df[[col_date, type_col, parcelle_col]].copy()
-        df_op[col_date] = pd.to_datetime(df_op[col_date], dayfirst=True, errors='coerce')
-        df_op = df_op.dropna(subset=[col_date])
-
-        # 💡 Apply the filter on intervention type
-        df_op = df_op[df_op[type_col].isin(operations)]
-
-        if df_op.empty:
+        masque = saison.lignes("Operation agricole")
+        if not masque.any():
             return None
 
-        # Create parcel coding
-        parcelle_names = df_op[parcelle_col].dropna().astype(str).str.strip()
-        parcelle_names = parcelle_names[parcelle_names != ''].unique()
-        codif_dict = {name: idx + 1 for idx, name in enumerate(parcelle_names)}
-
-        # Apply coding
-        df_op["Code parcelle"] = df_op[parcelle_col].map(codif_dict)
-        for code in codif_dict.values():
-            df_op[str(code)] = df_op["Code parcelle"].apply(lambda x: "x" if x == code else "")
+        # Group operations; columns use the codes of the codification table
+        cles = [saison.dates[masque].rename("Date"), df.loc[masque, COL_TYPE].rename("Type d'intervention")]
+        codes = [str(code) for code in range(1, len(saison.parcelles) + 1)]
+        marques = saison.marques_parcelles(cles, masque, en_codes=True).reindex(columns=codes, fill_value="")
 
-        # Group operations
-        grouped = df_op.groupby([col_date, type_col], dropna=False)
-        lignes_fusionnees = []
-
-        for (date, type_interv), group in grouped:
-            ligne = {"Date": date.strftime("%d/%m/%Y"), "Type d'intervention": type_interv}
-            for code in codif_dict.values():
-                ligne[str(code)] = 'x' if (group[str(code)] == 'x').any() else ''
-            lignes_fusionnees.append(ligne)
-
-        df_result = pd.DataFrame(lignes_fusionnees)
-        columns_order = ["Date", "Type d'intervention"] + sorted(str(c) for c in codif_dict.values())
-        return df_result[columns_order]
+        df_result = marques.reset_index()
+        df_result["Date"] = df_result["Date"].dt.strftime("%d/%m/%Y")
+        return df_result
 
     except Exception as e:
-        st.error(f"Erreur: {str(e)}")
+        signaler("error", f"Erreur: {str(e)}")
         return None
 
 
-def get_table_irrigation(df):
+def get_table_irrigation(saison):
     """Generate irrigation table"""
-    type_col = "Types d'interventions.Nom"
-    date_col = "Interventions des parcelles culturales.Date début"
-    dose_col = "Intrants des parcelles culturales.Dose"
-    parcelle_col = "Parcelles culturales.Nom"
+    import pandas as pd
 
-    required_cols = [type_col, date_col, dose_col, parcelle_col]
+    df = saison.df
+    required_cols = [COL_TYPE, COL_DATE, COL_DOSE, COL_PARCELLE]
     missing_cols = [col for col in required_cols if col not in df.columns]
 
     if missing_cols:
-        st.error(f"Colonnes manquantes: {', '.join(missing_cols)}")
+        signaler("error", f"Colonnes manquantes: {', '.join(missing_cols)}")
         return None
 
     try:
-        df_irrig = df[df[type_col].str.lower().str.strip() == "irrigation"].copy()
-
-        if df_irrig.empty:
+        masque = saison.lignes("Irrigation") & (saison.codes_parcelles > 0)
+        if not masque.any():
             return None
 
-        df_irrig[date_col] = pd.to_datetime(df_irrig[date_col], dayfirst=True, errors='coerce')
-        df_irrig = df_irrig.dropna(subset=[date_col])
-
-        df_result = df_irrig[[date_col, dose_col, parcelle_col]].copy()
-        df_result.rename(columns={
-            date_col: "Date",
-            dose_col: "Dose",
-            parcelle_col: "Parcelle"
-        }, inplace=True)
-
-        df_result["Pluie (mm)"] = ""
-        df_result["X"] = "x"
-
-        df_pivot = df_result.pivot_table(
-            index=["Date", "Dose", "Pluie (mm)"],
-            columns="Parcelle",
-            values="X",
-            aggfunc="first",
-            fill_value=""
-        ).reset_index()
+        cles = [
+            saison.dates[masque].rename("Date"),
+            df.loc[masque, COL_DOSE].rename("Dose"),
+            pd.Series("", index=df.index[masque], name="Pluie (mm)"),
+        ]
+        df_pivot = saison.marques_parcelles(cles, masque).reset_index()
+        df_pivot.columns.name = None
 
         df_pivot["Date"] = df_pivot["Date"].dt.strftime('%d/%m/%Y')
         return df_pivot
 
     except Exception as e:
-        st.error(f"Erreur irrigation: {str(e)}")
+        signaler("error", f"Erreur irrigation: {str(e)}")
         return None
 
 
-def get_table_fertilisation(df):
+def get_table_fertilisation(saison):
     """Generate fertilization table"""
-    fertilisation_types = [
-        "Amendements calco-magnésiens", "Biostimulant", "Boues de station d'épuration/compost urbain",
-        "Effluents d'élevage", "Fertilisation minérale", "Fertilisation minérale Bulk",
-        "Fertirrigation", "Obligo-éléments", "Organo-minéral", "Fertilisation organique",
-        "Sous-produits/déchets alimentaires", "Sous-produits/déchets non alimentaires", "Supports de culture"
-    ]
-
-    required_cols = {
-        'type': "Types d'interventions.Nom",
-        'date': "Interventions des parcelles culturales.Date début",
-        'dose': "Intrants des parcelles culturales.Dose",
-        'parcelle': "Parcelles culturales.Nom"
-    }
-
-    missing_cols = [col for col in required_cols.values() if col not in df.columns]
+    import pandas as pd
+
+    df = saison.df
+    required_cols = [COL_TYPE, COL_DATE, COL_DOSE, COL_PARCELLE]
+    missing_cols = [col for col in required_cols if col not in df.columns]
     if missing_cols:
-        st.error(f"Colonnes manquantes: {', '.join(missing_cols)}")
+        signaler("error", f"Colonnes manquantes: {', '.join(missing_cols)}")
         return None
 
     try:
-        df_fert = df[df[required_cols['type']].isin(fertilisation_types)].copy()
-
-        if df_fert.empty:
+        masque = saison.lignes("Fertilisation")
+        if not masque.any():
             return None
 
-        df_fert[required_cols['date']] = pd.to_datetime(
-            df_fert[required_cols['date']],
-            dayfirst=True,
-            errors='coerce'
-        )
-        df_fert = df_fert.dropna(subset=[required_cols['date']])
-
         # Prepare result
         column_mapping = {
-            required_cols['date']: "📅 Date",
-            "Traitements.Nom": "🧪 Produit",
-            required_cols['dose']: "💧 Dose",
+            COL_PRODUIT: "🧪 Produit",
+            COL_DOSE: "💧 Dose",
             "Engrais.N": "🧬 N",
             "Engrais.P2O5": "🧬 P₂O₅",
             "Engrais.K2O": "🧬 K₂O",
             "Engrais.CaO": "🧬 CaO",
             "Engrais.MgO": "🧬 MgO",
-            required_cols['parcelle']: "🌿 Parcelle"
         }
+        group_cols = ["📅 Date", "💧 Dose", "🧪 Produit", "🧬 N", "🧬 P₂O₅", "🧬 K₂O", "🧬 CaO", "🧬 MgO"]
 
-        available_cols = [col for col in column_mapping.keys() if col in df_fert.columns]
-        df_result = df_fert[available_cols].rename(columns=column_mapping)
-
-        # Add parcel markers
-        parcelles = df_fert[required_cols['parcelle']].dropna().unique()
-        for parcelle in parcelles:
-            df_result[parcelle] = df_fert[required_cols['parcelle']].apply(
-                lambda x: 'x' if x == parcelle else '')
+        df_fert = df.loc[masque, [col for col in column_mapping if col in df.columns]].rename(columns=column_mapping)
+        df_fert["📅 Date"] = saison.dates[masque]
+        group_cols = [col for col in group_cols if col in df_fert.columns]
 
         # Group similar operations
-        group_cols = [col for col in ["📅 Date", "💧 Dose", "🧪 Produit",
-                                      "🧬 N", "🧬 P₂O₅", "🧬 K₂O", "🧬 CaO", "🧬 MgO"]
-                      if col in df_result.columns]
-
-        grouped = df_result.groupby(group_cols, dropna=False)
-        lignes_fusionnees = []
-
-        for _, group in grouped:
-            ligne = group.iloc[0].copy()
-            for parcelle in parcelles:
-                ligne[parcelle] = 'x' if (group[parcelle] == 'x').any() else ''
-            lignes_fusionnees.append(ligne)
+        groupes = df_fert.groupby(group_cols, dropna=False, sort=True).ngroup().rename("Groupe")
+        premiere_ligne = ~groupes.duplicated()
+        premieres = df_fert[premiere_ligne].set_index(groupes[premiere_ligne]).sort_index()
+        marques = saison.marques_parcelles(groupes, masque)
 
-        df_final = pd.DataFrame(lignes_fusionnees)
-        if "📅 Date" in df_final.columns:
-            df_final["📅 Date"] = df_final["📅 Date"].dt.strftime("%d/%m/%Y")
-        df_final.drop(columns=["🌿 Parcelle"], inplace=True, errors='ignore')
+        colonnes = ["📅 Date"] + [col for col in column_mapping.values() if col in premieres.columns]
+        df_final = pd.concat([premieres[colonnes], marques], axis=1).reset_index(drop=True)
+        df_final["📅 Date"] = df_final["📅 Date"].dt.strftime("%d/%m/%Y")
 
         return df_final
 
     except Exception as e:
-        st.error(f"Erreur fertilisation: {str(e)}")
+        signaler("error", f"Erreur fertilisation: {str(e)}")
         return None
 
 
-def get_table_traitement(df):
+def get_table_traitement(saison):
     """Generate treatment table"""
-    excluded_types = [
-        "Amendements calco-magnésiens", "Biostimulant", "Boues de station d'épuration/compost urbain",
-        "Effluents d'élevage", "Fertilisation minérale", "Fertilisation minérale Bulk",
-        "Fertirrigation", "Obligo-éléments", "Organo-minéral", "Taille", "Fertilisation organique",
-        "Irrigation", "Sous-produits/déchets alimentaires", "Sous-produits/déchets non alimentaires",
-        "Supports de culture",
-        "Arrachage culture pérenne", "Broyage des bois de taille", "Brûlage des bois de taille",
-        "Ebourgeonnage", "Ébourgeonnage fructifère", "Écimage", "Eclaircissage manuel/physiologique",
-        "Elagage", "Elagage double tétes", "Entreplantation-complantation-rebrochage",
-        "Elagage double têtes", "Liage", "Marcotage", "Palissage", "Pré-taille", "Surgreffage",
-        "Taille au sabre", "Taille en vert", "Tirage des bois"
-    ]
-
-    required_cols = {
-        'type': "Types d'interventions.Nom",
-        'date': "Interventions des parcelles culturales.Date début",
-        'dose': "Intrants des parcelles culturales.Dose",
-        'produit': "Traitements.Nom",
-        'cible': "Cibles à l'intrant.Nom de la cible",
-        'parcelle': "Parcelles culturales.Nom"
-    }
-
-    missing_cols = [col for col in required_cols.values() if col not in df.columns]
+    import pandas as pd
+
+    df = saison.df
+    required_cols = [COL_TYPE, COL_DATE, COL_DOSE, COL_PRODUIT, COL_CIBLE, COL_PARCELLE]
+    missing_cols = [col for col in required_cols if col not in df.columns]
     if missing_cols:
-        st.error(f"Colonnes manquantes: {', '.join(missing_cols)}")
+        signaler("error", f"Colonnes manquantes: {', '.join(missing_cols)}")
         return None
 
     try:
-        df_trait = df[~df[required_cols['type']].isin(excluded_types)].copy()
-
-        if df_trait.empty:
+        # Every dated type not excluded, even those also listed in another table
+        masque = ~df[COL_TYPE].isin(TYPES_EXCLUS_TRAITEMENT) & saison.dates.notna()
+        if not masque.any():
             return None
 
-        df_trait[required_cols['date']] = pd.to_datetime(
-            df_trait[required_cols['date']],
-            dayfirst=True,
-            errors='coerce'
-        )
-        df_trait = df_trait.dropna(subset=[required_cols['date']])
-
-        # Add parcel markers
-        parcelles = df_trait[required_cols['parcelle']].dropna().unique()
-        for parcelle in parcelles:
-            df_trait[parcelle] = df_trait[required_cols['parcelle']].apply(
-                lambda x: 'x' if x == parcelle else '')
-
         # Group treatments
-        group_cols = [
-            required_cols['date'],
-            required_cols['produit'],
-            required_cols['type'],
-            required_cols['dose']
-        ]
-
-        grouped = df_trait.groupby(group_cols, dropna=False)
-        lignes_fusionnees = []
-
-        for _, group in grouped:
-            ligne = group.iloc[0].copy()
-            if required_cols['cible'] in group.columns:
-                ligne["Cible"] = group[required_cols['cible']].dropna().iloc[0] \
-                    if not group[required_cols['cible']].dropna().empty else ''
-            else:
-                ligne["Cible"] = ''
-
-            for parcelle in parcelles:
-                ligne[parcelle] = 'x' if (group[parcelle] == 'x').any() else ''
-            lignes_fusionnees.append(ligne)
+        df_trait = df.loc[masque, [COL_PRODUIT, COL_TYPE, COL_DOSE, COL_CIBLE]]
+        df_trait.insert(0, "Date", saison.dates[masque])
+        groupes = df_trait.groupby(["Date", COL_PRODUIT, COL_TYPE, COL_DOSE], dropna=False, sort=True)
+        numeros = groupes.ngroup().rename("Groupe")
 
-        df_result = pd.DataFrame(lignes_fusionnees)
-        df_result["Date"] = df_result[required_cols['date']].dt.strftime("%d/%m/%Y")
+        premiere_ligne = ~numeros.duplicated()
+        df_result = df_trait[premiere_ligne].set_index(numeros[premiere_ligne]).sort_index()
+        df_result["Cible"] = groupes[COL_CIBLE].first().set_axis(df_result.index).fillna('')
+        df_result["Date"] = df_result["Date"].dt.strftime("%d/%m/%Y")
 
         # Add empty columns
         df_result.insert(3, "DAR", "")
-        df_result.insert(6, "Commentaire", "")
+        df_result["Commentaire"] = ""
 
         # Organize columns
-        final_order = ["Date", required_cols['produit'], required_cols['type'],
-                       "DAR", required_cols['dose'], "Cible", "Commentaire"] + list(parcelles)
-        df_result = df_result[final_order]
+        final_order = ["Date", COL_PRODUIT, COL_TYPE, "DAR", COL_DOSE, "Cible", "Commentaire"]
+        df_result = pd.concat([df_result[final_order], saison.marques_parcelles(numeros, masque)], axis=1)
+        df_result = df_result.reset_index(drop=True)
 
         # Rename columns
         df_result.rename(columns={
-            required_cols['produit']: "Produit commercial",
-            required_cols['type']: "Matiere active",
-            required_cols['dose']: "Dose appliquée par ha"
+            COL_PRODUIT: "Produit commercial",
+            COL_TYPE: "Matiere active",
+            COL_DOSE: "Dose appliquée par ha"
         }, inplace=True)
 
         return df_result
 
     except Exception as e:
-        st.error(f"Erreur traitement: {str(e)}")
+        signaler("error", f"Erreur traitement: {str(e)}")
         return None
 
 
-def get_table_inventaire_parcelles(df):
+def get_table_inventaire_parcelles(saison):
     """Generate parcel inventory table"""
-    column_mapping = {
-        "Parcelles culturales.Nom": "Nom de la parcelle",
-        "Variétés de parcelle.Nom": "Variété",
-        "Parcelles culturales.Lieu-dit": "Lieu-dit",
-        "Parcelles culturales.Surface": "Surface (ha)",
-        "Parcelles culturales.PFI Verger éco responsable": "PFI Verger éco responsable",
-        "Parcelles culturales.ZRP Zéro Résidu Pesticide": "ZRP Zéro Résidu Pesticide",
-        "Parcelles culturales.Global Gap": "Global GAP",
-        "Parcelles culturales.HVE 3": "HVE 3"
-    }
+    df = saison.df
+    column_mapping = COLONNES_INVENTAIRE
 
     # Get available columns
     available_cols = [col for col in column_mapping.keys() if col in df.columns]
 
     if not available_cols:
-        st.error("Aucune colonne valide trouvée pour l'inventaire des parcelles")
+        signaler("error", "Aucune colonne valide trouvée pour l'inventaire des parcelles")
         return None
 
     # Create result dataframe
@@ -603,11 +650,231 @@ def get_table_inventaire_parcelles(df):
     return result
 
 
-def export_all_tables_to_excel(table_dict, raison_sociale):
-    """Export all tables to an Excel file"""
-    # Clean filename
+# Build the tables on a worker pool (developer setting). Off by default: the
+# builders mostly hold the GIL and no speedup has been measured yet.
+CONSTRUCTION_PARALLELE = False
+
+CONSTRUCTEURS_TABLES = {
+    "Exploitation": get_table_exploitations_parcelles,
+    "Codification Parcelles": get_table_codification_parcelles,
+    "Inventaire Parcelles": get_table_inventaire_parcelles,
+    "Operation agricole": get_table_operations_agricoles_codifie,
+    "Traitement": get_table_traitement,
+    "Fertilisation": get_table_fertilisation,
+    "Irrigation": get_table_irrigation,
+}
+
+
+def _construire_table(constructeur, saison):
+    """Run one builder, collecting its messages and errors instead of displaying them"""
+    precedent = getattr(_journal, "messages", None)
+    _journal.messages = []
+    try:
+        return constructeur(saison), _journal.messages
+    except Exception as e:
+        return None, _journal.messages + [("error", f"Erreur {constructeur.__name__}: {str(e)}")]
+    finally:
+        # Sequential builds run on the caller's thread, give its journal back
+        _journal.messages = precedent
+
+
+def construire_tables(saison, parallele=CONSTRUCTION_PARALLELE):
+    """Build all cahier tables, on a worker pool sharing the read-only season if parallele"""
+    if parallele:
+        with ThreadPoolExecutor(max_workers=len(CONSTRUCTEURS_TABLES)) as pool:
+            futures = {nom: pool.submit(_construire_table, constructeur, saison)
+                       for nom, constructeur in CONSTRUCTEURS_TABLES.items()}
+        resultats = {nom: future.result() for nom, future in futures.items()}
+    else:
+        resultats = {nom: _construire_table(constructeur, saison)
+                     for nom, constructeur in CONSTRUCTEURS_TABLES.items()}
+
+    tables = {}
+    for nom, (table, messages) in resultats.items():
+        for niveau, message in messages:
+            signaler(niveau, message)
+        tables[nom] = table
+    return tables
+
+
+class IndexSaison:
+    """Date-sorted row indexes over a processed season, for range and lookup queries"""
+
+    COLONNES_INDEXEES = [COL_PARCELLE, COL_PRODUIT, COL_TYPE]
+
+    def __init__(self, saison):
+        import numpy as np
+        import pandas as pd
+
+        self.df = saison.df.reset_index(drop=True)
+        dates = saison.dates.to_numpy()
+        self._ordre = np.argsort(dates, kind="stable")
+        self._dates = dates[self._ordre]
+
+        # Value -> (row positions, dates), both in date order
+        self._index = {}
+        for col in self.COLONNES_INDEXEES:
+            if col not in self.df.columns:
+                continue
+            cles = self.df[col].astype(str).str.strip().to_numpy()[self._ordre]
+            groupes = pd.Series(cles).groupby(cles, sort=True).indices
+            self._index[col] = {
+                cle: (self._ordre[rangs], self._dates[rangs])
+                for cle, rangs in groupes.items() if cle not in ("", "nan")
+            }
+
+    def valeurs(self, col):
+        """Indexed values of a column"""
+        return list(self._index.get(col, {}))
+
+    def _selection(self, col, valeurs):
+        import numpy as np
+
+        index = self._index.get(col, {})
+        parties = [index[v] for v in valeurs if v in index]
+        if not parties:
+            return self._ordre[:0], self._dates[:0]
+        if len(parties) == 1:
+            return parties[0]
+        positions = np.concatenate([p for p, _ in parties])
+        dates = np.concatenate([d for _, d in parties])
+        ordre = np.argsort(dates, kind="stable")
+        return positions[ordre], dates[ordre]
+
+    def requete(self, parcelles=None, produits=None, types=None, debut=None, fin=None):
+        """Rows matching every given criterion, in date order; date bounds are inclusive"""
+        import numpy as np
+        import pandas as pd
+
+        criteres = [(col, [valeurs] if isinstance(valeurs, str) else list(valeurs))
+                    for col, valeurs in zip(self.COLONNES_INDEXEES, (parcelles, produits, types))
+                    if valeurs]
+
+        # Start from the most selective index, the others only filter its rows
+        selections = [self._selection(col, valeurs) for col, valeurs in criteres]
+        if selections:
+            selections.sort(key=lambda sel: len(sel[0]))
+            positions, dates = selections[0]
+        else:
+            positions, dates = self._ordre, self._dates
+
+        gauche = 0 if debut is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(debut)), side="left")
+        droite = len(dates) if fin is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(fin)), side="right")
+        positions = positions[gauche:droite]
+
+        for autres, _ in selections[1:]:
+            positions = positions[np.isin(positions, autres)]
+
+        return self.df.iloc[positions]
+
+
+def preparer_cahier(uploaded_file, parallele=CONSTRUCTION_PARALLELE):
+    """Load, process and index an export and build its tables, collecting the messages"""
+    cahier = {"df_original": None, "df": None, "saison": None, "tables": {}, "index": None, "messages": []}
+    _journal.messages = cahier["messages"]
+    try:
+        exploitable, colonnes_manquantes = valider_entete(uploaded_file)
+        if not exploitable:
+            signaler("error", "❌ Export SMAG invalide, aucune colonne d'exploitation ou de parcelle trouvée")
+            return cahier
+        if colonnes_manquantes:
+            signaler("warning", f"Colonnes manquantes, certains tableaux ne seront pas générés : "
+                                f"{', '.join(colonnes_manquantes)}")
+
+        df = charger_fichier(uploaded_file)
+        if df is None:
+            return cahier
+
+        if df.empty:
+            signaler("error", "Le fichier chargé est vide ou ne contient pas de données valides")
+            return cahier
+
+        df = nettoyer_noms_colonnes(df)
+        cahier["df_original"] = df.copy()
+        df = traiter_donnees(df)
+
+        if df.empty:
+            signaler("error", "Aucune donnée ne correspond au critère 'Prévisionnelle = Non'")
+            return cahier
+
+        cahier["df"] = df
+        cahier["saison"] = saison = ModeleSaison(df)
+        cahier["tables"] = construire_tables(saison, parallele=parallele)
+        cahier["index"] = IndexSaison(saison)
+        return cahier
+    finally:
+        _journal.messages = None
+
+
+def afficher_recherche(index):
+    """Filter controls over the season index, the tables are not rebuilt"""
+    with st.expander("🔎 Rechercher des interventions"):
+        parcelles = st.multiselect("Parcelles", index.valeurs(COL_PARCELLE))
+        produits = st.multiselect("Produits", index.valeurs(COL_PRODUIT))
+        types = st.multiselect("Types d'intervention", index.valeurs(COL_TYPE))
+        periode = st.date_input("Période", value=())
+
+        debut, fin = (tuple(periode) + (None, None))[:2]
+        if debut is not None and fin is None:
+            fin = debut
+        resultat = index.requete(parcelles=parcelles, produits=produits, types=types, debut=debut, fin=fin)
+        st.caption(f"{len(resultat)} intervention(s)")
+        st.dataframe(resultat)
+
+
+# Columns of the per-parcel sheets: (header, source column)
+COLONNES_FEUILLE_PARCELLE = [
+    ("Date", COL_DATE),
+    ("Catégorie", "Catégorie"),
+    ("Type d'intervention", COL_TYPE),
+    ("Produit", COL_PRODUIT),
+    ("Dose", COL_DOSE),
+    ("Cible", COL_CIBLE),
+]
+
+
+def _nom_feuille(nom, noms_pris):
+    """Valid and unique Excel sheet name"""
+    base = "".join(c for c in str(nom) if c not in '[]:*?/\\').strip()[:31] or "Parcelle"
+    nom_feuille, n = base, 2
+    while nom_feuille.lower() in noms_pris:
+        suffixe = f" ({n})"
+        nom_feuille, n = base[:31 - len(suffixe)] + suffixe, n + 1
+    noms_pris.add(nom_feuille.lower())
+    return nom_feuille
+
+
+def ecrire_feuilles_parcelles(writer, saison):
+    """Write one sheet per parcel, partitioning the season in a single groupby pass"""
+    df = saison.df
+    if COL_PARCELLE not in df.columns or COL_TYPE not in df.columns:
+        signaler("warning", "Feuilles par parcelle impossibles : colonnes parcelle ou type manquantes")
+        return
+
+    masque = (saison.categories != "") & (saison.codes_parcelles > 0)
+    vue = df.loc[masque].assign(**{"Catégorie": saison.categories[masque]})
+    colonnes = [(entete, col) for entete, col in COLONNES_FEUILLE_PARCELLE if col in vue.columns]
+    vue = vue[[col for _, col in colonnes]].fillna("")
+
+    noms_pris = {nom.lower() for nom in writer.sheets}
+    for code, groupe in vue.groupby(saison.codes_parcelles[masque], sort=True):
+        feuille = writer.book.add_worksheet(_nom_feuille(saison.parcelles[code - 1], noms_pris))
+        feuille.write_row(0, 0, [entete for entete, _ in colonnes])
+        for ligne, valeurs in enumerate(groupe.itertuples(index=False, name=None), start=1):
+            feuille.write_row(ligne, 0, valeurs)
+
+
+def _nom_fichier_cahier(raison_sociale, extension):
+    """Clean export filename"""
     safe_name = "".join(c for c in raison_sociale if c.isalnum() or c in (' ', '_')).strip()
-    nom_fichier = f"Cahier_Cultural_{safe_name}_{datetime.now().strftime('%Y')}.xlsx"
+    return f"Cahier_Cultural_{safe_name}_{datetime.now().strftime('%Y')}.{extension}"
+
+
+def export_all_tables_to_excel(table_dict, raison_sociale, saison_parcelles=None):
+    """Export all tables to an Excel file, plus one sheet per parcel if saison_parcelles is given"""
+    import pandas as pd
+
+    nom_fichier = _nom_fichier_cahier(raison_sociale, "xlsx")
 
     output = io.BytesIO()
 
@@ -617,6 +884,9 @@ def export_all_tables_to_excel(table_dict, raison_sociale):
                 sheet_name = sheet_name[:31]  # Excel sheet name limit
                 df.to_excel(writer, index=False, sheet_name=sheet_name)
 
+        if saison_parcelles is not None:
+            ecrire_feuilles_parcelles(writer, saison_parcelles)
+
     st.download_button(
         label="📥 Télécharger toutes les tables (Excel)",
         data=output.getvalue(),
@@ -625,42 +895,235 @@ def export_all_tables_to_excel(table_dict, raison_sociale):
     )
 
 
+# --- PDF export ---
+TAILLE_POLICE_PDF = 7
+HAUTEUR_LIGNE_PDF = 11
+LARGEUR_MAX_COLONNE_PDF = 170
+LIGNES_MESUREES_PDF = 200
+# Parcel 'x' columns: fixed width and the least number printed side by side
+LARGEUR_MARQUE_PDF = 14
+MARQUES_MIN_PDF = 10
+
+# Characters the standard PDF fonts cannot draw
+_CARACTERES_PDF = str.maketrans({"₂": "2", "₅": "5", "…": "..."})
+
+
+def _texte_pdf(valeur):
+    """Cell value as text drawable with Helvetica"""
+    if valeur is None or valeur != valeur:  # None or NaN
+        return ""
+    texte = str(valeur).translate(_CARACTERES_PDF)
+    return texte.encode("cp1252", "ignore").decode("cp1252").strip()
+
+
+def _largeurs_colonnes_pdf(entetes, lignes):
+    """Natural column widths from the header and the first rows"""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    largeurs = [stringWidth(e, "Helvetica-Bold", TAILLE_POLICE_PDF) for e in entetes]
+    for ligne in lignes:
+        for i, texte in enumerate(ligne):
+            largeurs[i] = max(largeurs[i], stringWidth(texte, "Helvetica", TAILLE_POLICE_PDF))
+    return [min(l + 6, LARGEUR_MAX_COLONNE_PDF) for l in largeurs]
+
+
+def _bandes_colonnes_pdf(largeurs, marques, largeur_dispo):
+    """Split the columns into bands that fit the page width.
+
+    Data columns keep their width and are repeated on every band, the parcel
+    marker columns get a fixed narrow width and are spread over the bands.
+    Returns the widths and the column indices of each band.
+    """
+    largeurs = list(largeurs)
+    donnees = [i for i in range(len(largeurs)) if i not in marques]
+    marques = sorted(marques)
+
+    par_bande = reserve = 0
+    if marques:
+        place = largeur_dispo - sum(largeurs[i] for i in donnees)
+        par_bande = min(len(marques), max(MARQUES_MIN_PDF, int(place // LARGEUR_MARQUE_PDF)))
+        reserve = par_bande * LARGEUR_MARQUE_PDF
+        for i in marques:
+            largeurs[i] = LARGEUR_MARQUE_PDF
+
+    # Only data columns too wide for the page all together are scaled down
+    total = sum(largeurs[i] for i in donnees)
+    if total > largeur_dispo - reserve:
+        for i in donnees:
+            largeurs[i] *= (largeur_dispo - reserve) / total
+
+    if not marques:
+        return largeurs, [donnees]
+    return largeurs, [sorted(donnees + marques[d:d + par_bande]) for d in range(0, len(marques), par_bande)]
+
+
+def _ajuster_texte(texte, largeur, police):
+    """Cut a text to fit a column"""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    largeur -= 4
+    if stringWidth(texte, police, TAILLE_POLICE_PDF) <= largeur:
+        return texte
+    while texte and stringWidth(texte + "...", police, TAILLE_POLICE_PDF) > largeur:
+        texte = texte[:-1]
+    return texte + "..." if texte else ""
+
+
+def generer_pdf_cahier(table_dict, titre):
+    """Render all tables page by page with repeated headers"""
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.units import cm
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    largeur, hauteur = landscape(A4)
+    marge = 1.2 * cm
+    c = canvas.Canvas(buffer, pagesize=(largeur, hauteur), pageCompression=1)
+    c.setTitle(titre)
+    page = 0
+
+    # Parcel columns are headed by their code from the codification table
+    codes = {}
+    codification = table_dict.get("Codification Parcelles")
+    if codification is not None:
+        codes = {str(nom): str(code) for nom, code in
+                 zip(codification.loc["Nom de la parcelle"], codification.loc["Code parcelle"])}
+    codes_connus = set(codes.values())
+
+    for nom_table, df in table_dict.items():
+        if df is None or df.empty:
+            continue
+        if nom_table == "Codification Parcelles":
+            # Stored with one column per parcel, printed with one parcel per row
+            df = df.T
+
+        colonnes = [str(col) for col in df.columns]
+        marques = {i for i, col in enumerate(colonnes) if col in codes or col in codes_connus}
+        entetes = [codes.get(col, col) if i in marques else _texte_pdf(col) for i, col in enumerate(colonnes)]
+        echantillon = [[_texte_pdf(v) for v in ligne]
+                       for ligne in df.head(LIGNES_MESUREES_PDF).itertuples(index=False, name=None)]
+        largeurs, bandes = _bandes_colonnes_pdf(_largeurs_colonnes_pdf(entetes, echantillon), marques,
+                                                largeur - 2 * marge)
+        entetes = [_ajuster_texte(e, l, "Helvetica-Bold") for e, l in zip(entetes, largeurs)]
+
+        # Cell values repeat a lot, each distinct value is converted and cut once per column
+        cellules = [{} for _ in largeurs]
+
+        for bande in bandes:
+            titre_table = _texte_pdf(nom_table)
+            if len(bandes) > 1:
+                codes_bande = [entetes[i] for i in bande if i in marques]
+                titre_table += f" - parcelles {codes_bande[0]} à {codes_bande[-1]}"
+            largeurs_bande = [largeurs[i] for i in bande]
+            abscisses = [marge + sum(largeurs_bande[:i]) for i in range(len(bande) + 1)]
+            colonnes_bande = [(abscisses[k], largeurs[i], cellules[i]) for k, i in enumerate(bande)]
+
+            def nouvelle_page(suite):
+                nonlocal page
+                if page:
+                    c.showPage()
+                page += 1
+                c.setFont("Helvetica", 8)
+                c.drawString(marge, marge / 2, titre)
+                c.drawRightString(largeur - marge, marge / 2, f"Page {page}")
+
+                y = hauteur - marge
+                c.setFont("Helvetica-Bold", 12)
+                c.drawString(marge, y - 12, titre_table + (" (suite)" if suite else ""))
+                y -= 12 + HAUTEUR_LIGNE_PDF
+
+                # Header row, repeated on every page of the table
+                c.setFillColorRGB(0.85, 0.95, 0.85)
+                c.rect(marge, y - HAUTEUR_LIGNE_PDF, abscisses[-1] - marge, HAUTEUR_LIGNE_PDF, fill=1, stroke=0)
+                c.setFillColorRGB(0, 0, 0)
+                c.setFont("Helvetica-Bold", TAILLE_POLICE_PDF)
+                for x, i in zip(abscisses, bande):
+                    c.drawString(x + 2, y - HAUTEUR_LIGNE_PDF + 3, entetes[i])
+                return y - HAUTEUR_LIGNE_PDF
+
+            def fermer_page(texte, y_haut, y_bas):
+                c.drawText(texte)
+                c.setLineWidth(0.3)
+                for x in abscisses:
+                    c.line(x, y_haut, x, y_bas)
+                c.line(marge, y_bas, abscisses[-1], y_bas)
+
+            y = nouvelle_page(suite=False)
+            y_haut = y + HAUTEUR_LIGNE_PDF
+            texte = c.beginText()
+            texte.setFont("Helvetica", TAILLE_POLICE_PDF)
+            c.setLineWidth(0.1)
+            for ligne in df.iloc[:, bande].itertuples(index=False, name=None):
+                if y - HAUTEUR_LIGNE_PDF < marge:
+                    fermer_page(texte, y_haut, y)
+                    y = nouvelle_page(suite=True)
+                    y_haut = y + HAUTEUR_LIGNE_PDF
+                    texte = c.beginText()
+                    texte.setFont("Helvetica", TAILLE_POLICE_PDF)
+                    c.setLineWidth(0.1)
+                c.line(marge, y, abscisses[-1], y)
+                for (x, l, cache), valeur in zip(colonnes_bande, ligne):
+                    cellule = cache.get(valeur)
+                    if cellule is None:
+                        cellule = cache[valeur] = _ajuster_texte(_texte_pdf(valeur), l, "Helvetica")
+                    if cellule:
+                        texte.setTextOrigin(x + 2, y - HAUTEUR_LIGNE_PDF + 3)
+                        texte.textOut(cellule)
+                y -= HAUTEUR_LIGNE_PDF
+            fermer_page(texte, y_haut, y)
+
+    c.save()
+    buffer.seek(0)
+    return buffer
+
+
+def export_all_tables_to_pdf(table_dict, raison_sociale):
+    """Export all tables to a print-ready PDF, rendered when requested"""
+    nom_fichier = _nom_fichier_cahier(raison_sociale, "pdf")
+
+    if st.button("📄 Préparer le cahier en PDF"):
+        with st.spinner("Génération du PDF..."):
+            pdf = generer_pdf_cahier(table_dict, f"Cahier cultural - {raison_sociale.replace('_', ' ')}")
+        st.session_state["cahier_pdf"] = (nom_fichier, pdf.getvalue())
+
+    pdf = st.session_state.get("cahier_pdf")
+    if pdf is not None and pdf[0] == nom_fichier:
+        st.download_button(
+            label="📥 Télécharger le cahier (PDF)",
+            data=pdf[1],
+            file_name=nom_fichier,
+            mime="application/pdf"
+        )
+
+
 def main():
     st.title("Cahier culturel")
 
     uploaded_file = st.file_uploader("Téléchargez un fichier .txt", type=["txt"])
     if uploaded_file is not None:
-        df = charger_fichier(uploaded_file)
-
+        # Processed once per upload, widget reruns reuse the stored result
+        cle = uploaded_file.file_id
+        cahier = st.session_state.get("cahier")
+        if cahier is None or cahier["cle"] != cle:
+            cahier = preparer_cahier(uploaded_file)
+            cahier["cle"] = cle
+            st.session_state["cahier"] = cahier
+            st.session_state.pop("cahier_pdf", None)
+
+        if cahier["df_original"] is not None:
+            st.subheader("Tableau original")
+            st.dataframe(cahier["df_original"])
+
+        for niveau, message in cahier["messages"]:
+            getattr(st, niveau)(message)
+
+        df = cahier["df"]
         if df is not None:
-            if df.empty:
-                st.error("Le fichier chargé est vide ou ne contient pas de données valides")
-                return
-
-            df = nettoyer_noms_colonnes(df)
-            df_original = df.copy()
-            df = traiter_donnees(df)
-
-            if df.empty:
-                st.error("Aucune donnée ne correspond au critère 'Prévisionnelle = Non'")
-                return
-
             st.subheader("Tableau des Données Filtrées")
             st.dataframe(df)
 
-            # Generate all tables
-            tables = {
-                "Exploitation": get_table_exploitations_parcelles(df),
-                "Codification Parcelles": get_table_codification_parcelles(df),
-                "Inventaire Parcelles": get_table_inventaire_parcelles(df),
-                "Operation agricole": get_table_operations_agricoles_codifie(df),
-                "Traitement": get_table_traitement(df),
-                "Fertilisation": get_table_fertilisation(df),
-                "Irrigation": get_table_irrigation(df),
-            }
-
             # Filter out None or empty tables
-            tables = {k: v for k, v in tables.items() if v is not None and not v.empty}
+            tables = {k: v for k, v in cahier["tables"].items() if v is not None and not v.empty}
 
             if not tables:
                 st.error("Aucun tableau n'a pu être généré à partir des données")
@@ -678,13 +1141,18 @@ def main():
                 except Exception as e:
                     st.warning(f"Impossible de récupérer la raison sociale : {str(e)}")
 
+            # Search the season without rebuilding the tables
+            afficher_recherche(cahier["index"])
+
             # Display tables
             for name, table in tables.items():
                 st.subheader(name)
                 st.dataframe(table)
 
             # Export button
-            export_all_tables_to_excel(tables, raison_sociale)
+            par_parcelle = st.checkbox("Ajouter une feuille par parcelle")
+            export_all_tables_to_excel(tables, raison_sociale, cahier["saison"] if par_parcelle else None)
+            export_all_tables_to_pdf(tables, raison_sociale)
 
 
 if __name__ == "__main__":
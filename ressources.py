@@ -0,0 +1,120 @@
+# fichier : ressources.py
+# Static resources shared by every session of the server process
+import os
+import threading
+from io import BytesIO
+from textwrap import wrap
+from typing import NamedTuple
+
+import streamlit as st
+
+# --- Static assets ---
+LOGO_PATH = "logo1.PNG"
+SIGNATURE_PATH = "signaturer.PNG"
+
+# Width of the box each image is drawn in on the A4 attestation (cm) and print resolution
+LARGEUR_IMPRESSION_CM = {LOGO_PATH: 21.0 - 2, SIGNATURE_PATH: 21.0 - 4}
+DPI_IMPRESSION = 150
+QUALITE_JPEG = 85
+
+# --- Attestation template (everything after the first, personalised line)
+LARGEUR_LIGNE = 105
+CORPS_ATTESTATION = """A ce titre :
+• Son verger est suivi au moins à 3 reprises durant l’année, avec une préconisation.
+• Il reçoit chaque semaine les flash arbo.
+• Il bénéficie de la « hotline » technique de la chambre.
+• Il a participé aux réunions de bilan phytosanitaire et de programme phytosanitaire en hiver 2024-25.
+• Son cahier de culture et ses interventions phytosanitaires sont conformes aux réglementations en vigueur, la saisie et la gestion est réalisée sur notre outil de traçabilité SMAG Farmer."""
+
+
+def _horodatage(path):
+    """Modification time of a file, None if it does not exist"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ImagePreparee(NamedTuple):
+    """Prepared image (JPEG bytes or RGBA PIL image), with the size of the source file in points"""
+    source: object
+    largeur: float
+    hauteur: float
+
+    def lecteur(self):
+        """Fresh ImageReader for one PDF: readers keep a file position and are not shared"""
+        from reportlab.lib.utils import ImageReader
+
+        if isinstance(self.source, bytes):
+            return ImageReader(BytesIO(self.source))
+        return ImageReader(self.source)
+
+
+def _preparer_image(path, largeur_boite_cm):
+    """Downsample an image to the resolution it is printed at and recompress it"""
+    from PIL import Image
+
+    with Image.open(path) as source:
+        image = source.copy()
+    largeur, hauteur = image.size
+
+    # drawImage fits the source size (in points) into the box, which sets the printed width
+    largeur_imprimee = min(largeur, largeur_boite_cm / 2.54 * 72)
+    largeur_cible = round(largeur_imprimee / 72 * DPI_IMPRESSION)
+    if largeur > largeur_cible:
+        image = image.resize((largeur_cible, max(1, round(hauteur * largeur_cible / largeur))),
+                             Image.LANCZOS)
+
+    if "A" in image.getbands() or "transparency" in image.info:
+        # Keep the alpha channel for mask='auto', reportlab deflates the pixels
+        source = image.convert("RGBA")
+        source.load()
+    else:
+        # Opaque images are embedded as JPEG without being re-encoded for each PDF
+        tampon = BytesIO()
+        image.convert("RGB").save(tampon, format="JPEG", quality=QUALITE_JPEG, optimize=True)
+        source = tampon.getvalue()
+    return ImagePreparee(source, largeur, hauteur)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _charger_image(path, mtime):
+    if mtime is None:
+        return None
+    return _preparer_image(path, LARGEUR_IMPRESSION_CM.get(path, 21.0))
+
+
+def charger_image(path):
+    """Return the shared prepared image, rebuilt when the file changes on disk"""
+    return _charger_image(path, _horodatage(path))
+
+
+@st.cache_resource(show_spinner=False)
+def charger_modele_attestation():
+    """Wrap the static part of the attestation body once per process"""
+    return [wrap(line, width=LARGEUR_LIGNE) for line in CORPS_ATTESTATION.splitlines()]
+
+
+def prechauffer_ressources():
+    """Fill the shared caches so the first render does not pay for them"""
+    # Loaded once per process, the first PDF then only draws
+    import reportlab.lib.utils
+    import reportlab.pdfgen.canvas
+
+    charger_modele_attestation()
+    charger_image(LOGO_PATH)
+    charger_image(SIGNATURE_PATH)
+
+
+_prechauffage = None
+_prechauffage_lock = threading.Lock()
+
+
+def lancer_prechauffage():
+    """Warm the caches once per process in the background, without delaying the page"""
+    global _prechauffage
+    with _prechauffage_lock:
+        if _prechauffage is None:
+            _prechauffage = threading.Thread(target=prechauffer_ressources, daemon=True)
+            _prechauffage.start()
+    return _prechauffage